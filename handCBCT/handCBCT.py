@@ -128,6 +128,9 @@ class handCBCTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         # in batch mode, without a graphical user interface.
         self.logic = handCBCTLogic()
 
+        # Run nnUNet setup once the module is shown so the first run does not pay for it
+        self.logic.scheduleSetup()
+
         # Connections
 
         # These connections ensure that we update parameter node when scene is closed
@@ -232,7 +235,8 @@ class handCBCTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             self.ui.checkBox.setChecked(self.logic.hasValidParams)
 
             # Compute output
-            self.logic.process(self._parameterNode.inputVolume, self._parameterNode.foldCount, self._parameterNode.deviceType, self._parameterNode.outputSegment)
+            self.logic.process(self._parameterNode.inputVolume, self._parameterNode.foldCount, self._parameterNode.deviceType, self._parameterNode.outputSegment,
+                               disableTTA = self._parameterNode.disableTTA, stepSize = self._parameterNode.stepSize)
         
     def onStopButton(self):
         """
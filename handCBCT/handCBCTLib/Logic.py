@@ -1,4 +1,6 @@
+import collections
 import logging
+import os
 from pathlib import Path
 
 import slicer
@@ -9,10 +11,49 @@ from slicer import vtkMRMLScalarVolumeNode, vtkMRMLSegmentationNode
 from .Parameter import handCBCTParameterNode
 
 #
-# handCBCTLogic
+# _BufferedLogger
 #
 
 
+class _BufferedLogger:
+    """
+    Collect progress messages and forward them to logging in batches.
+
+    SlicerNNUNet emits a progress signal for every line printed by nnUNet and the installer,
+    writing each one to the console from the main thread adds up over a segmentation.
+    """
+
+    FLUSH_INTERVAL_MS = 100
+
+    def __init__(self):
+      import qt
+      self._messages = collections.deque()
+      self._timer = qt.QTimer()
+      self._timer.setSingleShot(True)
+      self._timer.setInterval(_BufferedLogger.FLUSH_INTERVAL_MS)
+      self._timer.connect("timeout()", self.flush)
+
+    def push(self, message) -> None:
+      """
+      Queue a message, it is logged at the next flush
+      """
+      self._messages.append(str(message))
+      if not self._timer.isActive():
+        self._timer.start()
+
+    def flush(self) -> None:
+      """
+      Log all queued messages at once
+      """
+      if self._messages:
+        logging.info("\n".join(self._messages))
+        self._messages.clear()
+
+
+#
+# handCBCTLogic
+#
+
 
 class handCBCTLogic(ScriptedLoadableModuleLogic):
     """This class should implement all the actual
@@ -27,6 +68,16 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
     # model constants
     MODEL_CHECKPOINT = "checkpoint_final.pth"
     MODEL_WEIGHT_NAME = "Dataset001_hand"
+    MODEL_WEIGHT_URL = f"https://github.com/ManskeLab/slicer-hand-nnUNet/releases/latest/download/{MODEL_WEIGHT_NAME}.zip"
+
+    # download constants
+    DOWNLOAD_SHARDS = 8
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+    DOWNLOAD_TIMEOUT = (10, 60) # seconds to connect, seconds without receiving data
+    EXTRACT_WORKERS = 4 # parallel extraction stops scaling past a few workers on typical disks
+
+    # SlicerNNUNetLib module, imported once by nnunetLib()
+    _nnunetLib = None
 
     def __init__(self):
       """
@@ -39,6 +90,15 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
       # flags for setup related tasks
       self.dependenciesInstalled = False
       self.is_setup = False
+
+      # progress messages from SlicerNNUNet are logged in batches
+      self._progressLogger = _BufferedLogger()
+
+      # modelParameters.isValid() results, keyed by the repr of the parameters checked
+      self._paramValidityCache = {}
+
+      # start time of the running segmentation, see _onInferenceFinished
+      self._processStartTime = None
     
     def getParameterNode(self):
       """
@@ -46,7 +106,7 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
       """
       return handCBCTParameterNode(super().getParameterNode())
     
-    def process(self, inputVolume: vtkMRMLScalarVolumeNode, foldCount: int, deviceType: str, outputSegment: vtkMRMLSegmentationNode):
+    def process(self, inputVolume: vtkMRMLScalarVolumeNode, foldCount: int, deviceType: str, outputSegment: vtkMRMLSegmentationNode, disableTTA: bool = True, stepSize: float = 0.5, wait: bool = False):
       """
       Run the processing algorithm.
       Can be used without GUI widget.
@@ -55,10 +115,18 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
       :param foldCount: number of folds for nnunet
       :param deviceType: device type used 
       :param outputVolume: segmentation result
+      :param disableTTA: disable nnUNet test-time augmentation (mirroring)
+      :param stepSize: sliding window step size as a fraction of the patch size
+      :param wait: block until inference has finished; by default return immediately so the UI stays responsive
+      :return: the SlicerNNUNet SegmentationLogic running the inference, connect to its inferenceFinished signal to be notified
 
       See handCBCTParameterNode for more details
       """
 
+      # a deferred setup skips the dependency check, run it before the first inference
+      if not self.dependenciesInstalled:
+        self.installDependencies()
+
       if not self.is_setup:
         self.setup()
 
@@ -67,21 +135,32 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
 
       self.modelParameters.folds = handCBCTLogic.produceFoldString(foldCount)
       self.modelParameters.device = deviceType
+      self.modelParameters.disableTta = disableTTA
+      self.modelParameters.stepSize = stepSize
       self._reloadParameters()
 
       import time
-      startTime = time.time()
+      self._processStartTime = time.time()
       logging.info('Processing started')
-      
 
-      # TODO: enable modification of parameters, specifically the fold count. Integrate with parameter nodes, or provide an update function if run from GUI.
+      # inference runs in a separate process, completion is reported through inferenceFinished
       self.segmentationLogic.startSegmentation(inputVolume)
 
-      # avoid blocking UI thread
-      # self.segmentationLogic.waitForSegmentationFinished()
-      
-      stopTime = time.time()
-      logging.info(f'Processing completed in {stopTime-startTime:.2f} seconds')
+      if wait:
+        self.segmentationLogic.waitForSegmentationFinished()
+
+      return self.segmentationLogic
+
+    def _onInferenceFinished(self) -> None:
+      """
+      Log the duration of the segmentation started by process()
+      """
+      if self._processStartTime is None:
+        return
+
+      import time
+      logging.info(f'Processing completed in {time.time()-self._processStartTime:.2f} seconds')
+      self._processStartTime = None
       
 
     def installDependencies(self):
@@ -89,59 +168,108 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
       Install dependencies utilizing the SlicerNNuNet extension
       """
       try:
-        import SlicerNNUNetLib
+        nnunetLib = handCBCTLogic.nnunetLib()
       except ModuleNotFoundError as err:
         slicer.util.errorDisplay("This module requires the SlicerNNUNet extension. Please install it in Extension Manager.")
         raise err
 
-      from SlicerNNUNetLib import InstallLogic
-      install_logic = InstallLogic()
-      install_logic.progressInfo.connect(print) # TODO: review later whether we wish to log somewhere else
+      install_logic = nnunetLib.InstallLogic()
+      install_logic.progressInfo.connect(self._progressLogger.push)
       install_logic.setupPythonRequirements()
+      self._progressLogger.flush()
 
       self.dependenciesInstalled = True
 
-    def setup(self):
+    def scheduleSetup(self) -> None:
       """
-      Setup logic including installing dependencies, loading model weight, and defining self.segmentationLogic
+      Queue setup to run once control returns to the Qt event loop, so the first process() call does not pay for it.
+
+      The queued setup is skipped unless the weights are downloaded and the nnUNet dependencies are importable,
+      it never downloads or installs anything. See _deferredSetup.
       """
-      if not self.dependenciesInstalled:
-        self.installDependencies()
+      import qt
+      qt.QTimer.singleShot(0, self._deferredSetup)
+
+    def _deferredSetup(self) -> None:
+      """
+      Deferred counterpart of setup(), see scheduleSetup. Failures are logged and setup is retried by process().
+      """
+      if self.is_setup or not self.weightsExist:
+        return
+
+      # installing requirements may prompt the user, leave that to the first process() call
+      import importlib.util
+      if not all(importlib.util.find_spec(name) for name in ("SlicerNNUNetLib", "nnunetv2")):
+        return
+
+      try:
+        self.setup(notify = False, allowInstall = False)
+      except Exception:
+        logging.exception("Deferred setup failed, retrying on first process() call")
+
+    @classmethod
+    def nnunetLib(cls):
+      """
+      SlicerNNUNetLib module, imported on first use and reused afterwards
+
+      :return: the SlicerNNUNetLib module
+      :raises ModuleNotFoundError: if the SlicerNNUNet extension is not installed
+      """
+      if cls._nnunetLib is None:
+        import SlicerNNUNetLib
+        cls._nnunetLib = SlicerNNUNetLib
+      return cls._nnunetLib
 
-      # SlicerNNUNetLib is installed
-      from SlicerNNUNetLib import SegmentationLogic
+    def setup(self, notify: bool = True, allowInstall: bool = True):
+      """
+      Setup logic including installing dependencies, loading model weight, and defining self.segmentationLogic
 
-      self.segmentationLogic = SegmentationLogic()
+      :param notify: show message boxes about the loaded model directory
+      :param allowInstall: run installDependencies if it has not run yet
+      """
+      if not self.dependenciesInstalled and allowInstall:
+        self.installDependencies()
 
-      # connect Segmentation signals
-      self.segmentationLogic.progressInfo.connect(print)
-      self.segmentationLogic.errorOccurred.connect(slicer.util.errorDisplay)
-      self.segmentationLogic.inferenceFinished.connect(self.segmentationLogic.loadSegmentation) 
-      # TODO: reconfigure signal to connect to custom method; currently experiencing issues with loadSegmentation
+      # SlicerNNUNetLib is installed; keep a single SegmentationLogic so its signal connections survive a setup retry
+      if self.segmentationLogic is None:
+        self.segmentationLogic = handCBCTLogic.nnunetLib().SegmentationLogic()
+
+        # connect Segmentation signals
+        self.segmentationLogic.progressInfo.connect(self._progressLogger.push)
+        self.segmentationLogic.errorOccurred.connect(slicer.util.errorDisplay)
+        self.segmentationLogic.inferenceFinished.connect(self._progressLogger.flush)
+        self.segmentationLogic.inferenceFinished.connect(self._onInferenceFinished)
+        self.segmentationLogic.inferenceFinished.connect(self.segmentationLogic.loadSegmentation) 
+        # TODO: reconfigure signal to connect to custom method; currently experiencing issues with loadSegmentation
       
       # prepare nnunet Parameter
-      from SlicerNNUNetLib import Parameter
-      self.modelParameters = Parameter()
+      if not self.modelParameters:
+        self.modelParameters = handCBCTLogic.nnunetLib().Parameter()
 
-      if not (self.getModelPath() / handCBCTLogic.MODEL_WEIGHT_NAME).exists():
+      if not self.weightsExist:
         self.downloadWeights()
 
-      self.loadWeights() # loadWeights will download weights if not already downloaded
+      self.loadWeights(notify = notify, allowInstall = allowInstall) # loadWeights will download weights if not already downloaded
       self.is_setup = True
 
-    def loadWeights(self):
+    def loadWeights(self, notify: bool = True, allowInstall: bool = True):
       """
       Load weights for nnUNet from folder
       Folder specifications: https://github.com/KitwareMedical/SlicerNNUnet?tab=readme-ov-file#expected-weight-folder-structure
 
       See the SlicerNNUNetLib Parameter class for more details
+
+      :param notify: show message boxes about the loaded model directory
+      :param allowInstall: run installDependencies if it has not run yet
       """
-      if not self.dependenciesInstalled:
+      if not self.dependenciesInstalled and allowInstall:
         self.installDependencies()
 
-      
+      # loading is the explicit re-validation point, forget results for a previously loaded directory
+      self._paramValidityCache.clear()
+
       # get model path and check if it exists, download if it does not exist
-      modelPath = self.getModelPath() / handCBCTLogic.MODEL_WEIGHT_NAME
+      modelPath = self.getWeightPath()
       if not modelPath.exists():
         # avoid tying loading with download
         # self.downloadWeights()
@@ -149,17 +277,17 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
         return
 
       if not self.modelParameters:
-        from SlicerNNUNetLib import Parameter
-        self.modelParameters = Parameter()
+        self.modelParameters = handCBCTLogic.nnunetLib().Parameter()
       
       self.modelParameters.modelPath = modelPath
       self.modelParameters.checkPointName = handCBCTLogic.MODEL_CHECKPOINT
 
       # testing purposes, check whether the directory is valid
-      if self.hasValidParams:
-        slicer.util.messageBox("Model directory is valid.")
+      message = "Model directory is valid." if self.hasValidParams else "Model directory is not valid."
+      if notify:
+        slicer.util.messageBox(message)
       else:
-        slicer.util.messageBox("Model directory is not valid.")
+        logging.info(message)
 
       # attach updated model parameters to segmentation logic
       self._reloadParameters()
@@ -174,52 +302,153 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
       :return: boolean indicating success of download
       :rtype: bool
       """
-      
-      # obtain release URL (code adapted from https://github.com/gaudot/SlicerDentalSegmentator/blob/main/DentalSegmentator/DentalSegmentatorLib/PythonDependencyChecker.py)
+      weightPath = self.getWeightPath()
+
+      if weightPath.exists() and not downloadAgain:
+        slicer.util.messageBox("Already downloaded.")
+        return False
 
-      from github import Github, GithubException
-      gh = Github()
-      repo = gh.get_repo("ManskeLab/slicer-hand-nnUNet")
-      assets = [asset for release in repo.get_releases() for asset in release.get_assets() if asset.name == handCBCTLogic.MODEL_WEIGHT_NAME + ".zip"]
+      slicer.util.messageBox("Downloading model. This may take some time.")
+      self.getModelPath().mkdir(parents = True, exist_ok = True)
 
-      url = assets[0].browser_download_url
-      
-      weightPath = self.getModelPath() / handCBCTLogic.MODEL_WEIGHT_NAME
+      # a single request against the latest release asset resolves its download location and size;
+      # sent after the modal box since the redirected asset URL is signed and expires after a few minutes
+      import requests
+      head = requests.head(handCBCTLogic.MODEL_WEIGHT_URL, allow_redirects = True, timeout = handCBCTLogic.DOWNLOAD_TIMEOUT)
+      head.raise_for_status()
+
+      import tempfile
+      # stage in the model directory so the final move is an atomic rename on the same filesystem;
+      # existing weights are only replaced once download and extraction have succeeded
+      with tempfile.TemporaryDirectory(dir = self.getModelPath()) as tmpDir:
+        tmpDir = Path(tmpDir)
+
+        zipPath = tmpDir / (handCBCTLogic.MODEL_WEIGHT_NAME + ".zip")
+        handCBCTLogic._fetchFile(head, zipPath)
+
+        extractPath = tmpDir / handCBCTLogic.MODEL_WEIGHT_NAME
+        handCBCTLogic._extractZip(zipPath, extractPath)
+        zipPath.unlink() # halve peak disk usage before swapping weights
+
+        if weightPath.exists():
+          # old weights are deleted along with the temporary directory
+          os.replace(weightPath, tmpDir / "previous")
+        os.replace(extractPath, weightPath)
+
+      self._paramValidityCache.clear()
+
+      slicer.util.messageBox("Download complete.")
+      return True
+
+    @staticmethod
+    def _fetchFile(head, filePath: Path) -> None:
+      """
+      Download the file described by a HEAD response to filePath, using parallel HTTP range requests when the server supports them.
+
+      The Slicer UI is kept repainting while the download runs on worker threads.
+
+      :param head: requests.Response of a HEAD request (with redirects followed) for the file to download
+      :param filePath: destination of the downloaded file
+      """
+      import concurrent.futures
+      import requests
+
+      url = head.url # resolved redirect, avoids one round-trip per shard
+      size = int(head.headers.get("Content-Length", 0))
 
-      if not weightPath.exists() or downloadAgain:
+      shardCount = handCBCTLogic.DOWNLOAD_SHARDS
+      if head.headers.get("Accept-Ranges") != "bytes" or size < shardCount * handCBCTLogic.DOWNLOAD_CHUNK_SIZE:
+        shardCount = 1
 
-        if downloadAgain and weightPath.exists():
-          import shutil
-          shutil.rmtree(weightPath)
+      # preallocate so each shard writes in place at its own offset
+      with open(filePath, "wb") as f:
+        f.truncate(size)
 
-        slicer.util.messageBox("Downloading model. This may take some time.")
-        weightPath.mkdir(parents = True)
+      def fetchShard(start: int, stop: int) -> None:
+        headers = {"Range": f"bytes={start}-{stop - 1}"} if shardCount > 1 else {}
+        written = 0
+        with requests.get(url, headers = headers, stream = True, timeout = handCBCTLogic.DOWNLOAD_TIMEOUT) as response:
+          response.raise_for_status()
+          if shardCount > 1 and response.status_code != 206:
+            raise IOError("Server ignored the requested byte range")
 
-        import requests
-        session = requests.Session()
-        response = session.get(url, stream = True)
-        
-        response.raise_for_status()
+          with open(filePath, "r+b") as f:
+            f.seek(start)
+            for chunk in response.iter_content(handCBCTLogic.DOWNLOAD_CHUNK_SIZE):
+              written += f.write(chunk)
 
-        zipPath = str(weightPath) + ".zip"
-        with open(zipPath, "wb") as f:
-          for chunk in response.iter_content(1024 * 1024):
-            f.write(chunk)
+        if size and written != stop - start:
+          raise IOError(f"Incomplete download: expected {stop - start} bytes at offset {start}, got {written}")
 
+      shardSize = max(-(-size // shardCount), 1)
+      with concurrent.futures.ThreadPoolExecutor(max_workers = shardCount) as executor:
+        futures = [executor.submit(fetchShard, start, min(start + shardSize, size)) for start in range(0, max(size, 1), shardSize)]
+        handCBCTLogic._waitForFutures(futures)
 
-        import zipfile
-        
+    @staticmethod
+    def _extractZip(zipPath: Path, targetPath: Path) -> None:
+      """
+      Extract zipPath into targetPath, with archive members split across worker threads.
+
+      Each worker opens its own ZipFile since file objects are not thread-safe.
+
+      :param zipPath: archive to extract
+      :param targetPath: directory to extract into
+      """
+      import concurrent.futures
+      import zipfile
+
+      with zipfile.ZipFile(zipPath, "r") as f:
+        members = [info for info in f.infolist() if not info.is_dir()]
+
+      # create folders up front, concurrent extraction would race on creating shared parents
+      targetPath = targetPath.resolve()
+      for info in members:
+        parent = (targetPath / info.filename).resolve().parent
+        if not parent.is_relative_to(targetPath):
+          raise IOError(f"Archive member outside of the target directory: {info.filename}")
+        parent.mkdir(parents = True, exist_ok = True)
+
+      # deal largest members first so workers end up with similar amounts of data
+      workerCount = max(min(handCBCTLogic.EXTRACT_WORKERS, os.cpu_count() or 1, len(members)), 1)
+      members.sort(key = lambda info: info.file_size, reverse = True)
+      batches = [members[i::workerCount] for i in range(workerCount)]
+
+      def extractBatch(batch: list) -> None:
         with zipfile.ZipFile(zipPath, "r") as f:
-            f.extractall(weightPath)
+          for info in batch:
+            f.extract(info, targetPath)
+
+      with concurrent.futures.ThreadPoolExecutor(max_workers = workerCount) as executor:
+        handCBCTLogic._waitForFutures([executor.submit(extractBatch, batch) for batch in batches])
+
+    @staticmethod
+    def _waitForFutures(futures: list) -> None:
+      """
+      Block until all futures are done while letting Qt repaint, then re-raise the first failure.
+
+      After a failure, futures that have not started are cancelled and running ones are waited for.
+
+      :param futures: list of concurrent.futures.Future
+      """
+      import concurrent.futures
+      import qt
+
+      pending = set(futures)
+      failed = False
+      while pending:
+        done, pending = concurrent.futures.wait(pending, timeout = 0.1, return_when = concurrent.futures.FIRST_EXCEPTION)
+        slicer.app.processEvents(qt.QEventLoop.ExcludeUserInputEvents)
+        if not failed and any(not future.cancelled() and future.exception() for future in done):
+          failed = True
+          for future in pending:
+            future.cancel()
+
+      for future in futures:
+        if not future.cancelled():
+          future.result()
 
-        slicer.util.messageBox("Download complete.")
-        return True
-      else:
-        slicer.util.messageBox("Already downloaded.")
-        return False
-        
 
-    
     def _reloadParameters(self) -> None:
       """
       Reattach parameters to self.segmentationLogic
@@ -230,6 +459,16 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
         self.segmentationLogic.setParameter(self.modelParameters)
 
 
+    @staticmethod
+    def getWeightPath() -> Path:
+      """
+      Path to the nnUNet weights folder inside the model directory.
+
+      :return: path to the downloaded weights folder
+      :rtype: pathlib.Path
+      """
+      return handCBCTLogic.getModelPath() / handCBCTLogic.MODEL_WEIGHT_NAME
+
     @staticmethod
     def getModelPath() -> Path:
       """
@@ -281,19 +520,22 @@ class handCBCTLogic(ScriptedLoadableModuleLogic):
       :rtype: bool
       """
       if self.modelParameters:
-        modelResponse = self.modelParameters.isValid()
-        print(modelResponse[1])
-        return modelResponse[0]
+        # isValid walks the weights directory, only re-check when the parameters change
+        key = repr(self.modelParameters)
+        if key not in self._paramValidityCache:
+          self._paramValidityCache[key] = self.modelParameters.isValid()
+          logging.debug(self._paramValidityCache[key][1])
+        return self._paramValidityCache[key][0]
       else:
         return False
       
     @property
     def weightsExist(self) -> bool:
       """
-      Docstring for weightsExist
+      Whether the weights folder exists (has been downloaded or placed by hand)
       
       :return: boolean value representing whether weights directory exists (has been downloaded)
       :rtype: bool
       """
 
-      return (self.getModelPath() / handCBCTLogic.MODEL_WEIGHT_NAME).exists()
+      return self.getWeightPath().exists()
@@ -7,7 +7,7 @@ Could be merged into Logic.py, but would not make much sense semantically
 from typing import Annotated
 
 from slicer import vtkMRMLScalarVolumeNode, vtkMRMLSegmentationNode
-from slicer.parameterNodeWrapper import parameterNodeWrapper, Choice
+from slicer.parameterNodeWrapper import parameterNodeWrapper, Choice, WithinRange
 
 
 @parameterNodeWrapper
@@ -18,11 +18,15 @@ class handCBCTParameterNode:
     inputVolume - volume to segment
     foldCount - number of folds for nnUNet model configuration
     deviceType - the device type for nnUNet model configuration
+    disableTTA - disable nnUNet test-time augmentation (mirroring) for faster inference
+    stepSize - sliding window step size as a fraction of the patch size
     outputSegment - segmentation result
     """
 
     inputVolume: vtkMRMLScalarVolumeNode
     foldCount: Annotated[int, Choice([1, 2, 3, 4, 5])] = 1 # default to 1 for performance purposes
     deviceType: Annotated[str, Choice(["cuda", "cpu", "mps"])] = "cuda"
+    disableTTA: bool = True # TTA multiplies inference time, disable by default for performance purposes
+    stepSize: Annotated[float, WithinRange(0.1, 1.0)] = 0.5 # nnUNet default, larger values evaluate fewer patches
     outputSegment: vtkMRMLSegmentationNode
 